@@ -1,8 +1,21 @@
 from django.contrib import admin
+from .admin_paginator import NoCountPaginator
 from .models import LoanType, BorrowerProfile, LoanApplication, LoanDocument, Notification, LoanWithdrawal, LoanPayment
 
+class ChangelistDeferMixin:
+    """Skip loading large text columns on the changelist; change forms still load them"""
+    changelist_defer = []
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.changelist_defer and match and match.url_name.endswith('_changelist'):
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
+
 @admin.register(LoanType)
-class LoanTypeAdmin(admin.ModelAdmin):
+class LoanTypeAdmin(ChangelistDeferMixin, admin.ModelAdmin):
+    changelist_defer = ['description', 'requirements']
     list_display = ['name', 'category', 'interest_rate', 'max_amount', 'is_active']
     list_filter = ['category', 'is_active']
     search_fields = ['name']
@@ -10,38 +23,67 @@ class LoanTypeAdmin(admin.ModelAdmin):
 @admin.register(BorrowerProfile)
 class BorrowerProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'id_number', 'phone_number', 'employment_status', 'credit_score']
+    list_select_related = ['user']
     search_fields = ['user__username', 'id_number', 'phone_number']
     list_filter = ['employment_status']
+    raw_id_fields = ['user']
 
 @admin.register(LoanApplication)
-class LoanApplicationAdmin(admin.ModelAdmin):
+class LoanApplicationAdmin(ChangelistDeferMixin, admin.ModelAdmin):
+    paginator = NoCountPaginator
+    show_full_result_count = False
+    changelist_defer = ['purpose', 'rejection_reason']
+    list_per_page = 25
+    list_max_show_all = 200
     list_display = ['applicant', 'loan_type', 'amount', 'term_months', 'status', 'application_date']
+    list_select_related = ['applicant', 'loan_type']
     list_filter = ['status', 'loan_type', 'application_date']
     search_fields = ['applicant__username', 'purpose']
     readonly_fields = ['application_date', 'approved_date']
+    raw_id_fields = ['applicant', 'approved_by', 'loan_type']
 
 @admin.register(LoanDocument)
 class LoanDocumentAdmin(admin.ModelAdmin):
+    list_per_page = 25
+    list_max_show_all = 200
     list_display = ['loan_application', 'document_type', 'verified', 'uploaded_at']
+    list_select_related = ['loan_application__applicant', 'loan_application__loan_type']
     list_filter = ['document_type', 'verified']
     search_fields = ['loan_application__applicant__username']
+    raw_id_fields = ['loan_application']
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(ChangelistDeferMixin, admin.ModelAdmin):
+    paginator = NoCountPaginator
+    show_full_result_count = False
+    changelist_defer = ['message']
+    list_per_page = 25
+    list_max_show_all = 200
     list_display = ['user', 'title', 'notification_type', 'is_read', 'created_at']
+    list_select_related = ['user']
     list_filter = ['notification_type', 'is_read', 'created_at']
     search_fields = ['user__username', 'title']
     readonly_fields = ['created_at']
+    raw_id_fields = ['user']
 
 @admin.register(LoanWithdrawal)
-class LoanWithdrawalAdmin(admin.ModelAdmin):
+class LoanWithdrawalAdmin(ChangelistDeferMixin, admin.ModelAdmin):
+    changelist_defer = ['failure_reason']
     list_display = ['loan_application', 'mpesa_number', 'amount', 'status', 'withdrawal_date']
+    list_select_related = ['loan_application__applicant', 'loan_application__loan_type']
     list_filter = ['status', 'withdrawal_date']
     readonly_fields = ['withdrawal_date', 'processed_date']
+    raw_id_fields = ['loan_application']
 
 @admin.register(LoanPayment)
 class LoanPaymentAdmin(admin.ModelAdmin):
+    paginator = NoCountPaginator
+    show_full_result_count = False
+    list_per_page = 25
+    list_max_show_all = 200
     list_display = ['loan_application', 'amount', 'due_date', 'status', 'payment_method', 'payment_date']
+    list_select_related = ['loan_application__applicant', 'loan_application__loan_type']
     list_filter = ['status', 'payment_method', 'due_date']
     search_fields = ['loan_application__applicant__username', 'transaction_id']
-    readonly_fields = ['payment_date']
\ No newline at end of file
+    readonly_fields = ['payment_date']
+    raw_id_fields = ['loan_application']
\ No newline at end of file
@@ -0,0 +1,10 @@
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+
+class NoCountPaginator(Paginator):
+    """Paginator that skips the COUNT(*) query on admin changelists"""
+
+    @cached_property
+    def count(self):
+        return 9999999
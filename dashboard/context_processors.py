@@ -0,0 +1,6 @@
+from .notifications import get_request_unread_count
+
+
+def notifications(request):
+    """Expose the cached unread notification count to every template"""
+    return {'unread_notification_count': get_request_unread_count(request)}
@@ -1,7 +1,12 @@
 from django import forms
 from .models import LoanApplication, BorrowerProfile, LoanDocument, LoanType, LoanWithdrawal, LoanPayment
+from .loan_types import get_active_loan_types
 from django.contrib.auth.models import User
-import os  # Add this import
+import re
+
+_MPESA_RE = re.compile(r'2547[0-9]{8}')
+_IMG_EXTS = ('.jpg', '.jpeg', '.png', '.gif')
+_DOC_EXTS = ('.jpg', '.jpeg', '.png', '.pdf')
 
 class BorrowerProfileForm(forms.ModelForm):
     class Meta:
@@ -32,9 +37,7 @@ class BorrowerProfileForm(forms.ModelForm):
                 raise forms.ValidationError('Profile picture size must be less than 2MB.')
             
             # Check file extension
-            valid_extensions = ['.jpg', '.jpeg', '.png', '.gif']
-            ext = os.path.splitext(profile_picture.name)[1].lower()
-            if ext not in valid_extensions:
+            if not profile_picture.name.lower().endswith(_IMG_EXTS):
                 raise forms.ValidationError('Unsupported file format. Please upload JPG, JPEG, PNG, or GIF files.')
         
         return profile_picture
@@ -51,8 +54,12 @@ class LoanApplicationForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Only show active loan types
-        self.fields['loan_type'].queryset = LoanType.objects.filter(is_active=True)
+        # Only show active loan types; render the choices from the cached list
+        # so a GET does not query the table (cleared by dashboard.signals)
+        active_types = get_active_loan_types()
+        field = self.fields['loan_type']
+        field.queryset = LoanType.objects.filter(pk__in=[t.pk for t in active_types])
+        field.choices = [('', field.empty_label)] + [(t.pk, str(t)) for t in active_types]
 
 class LoanDocumentForm(forms.ModelForm):
     class Meta:
@@ -73,9 +80,7 @@ class LoanDocumentForm(forms.ModelForm):
                 raise forms.ValidationError('File size must be less than 5MB.')
             
             # Check file extension
-            valid_extensions = ['.jpg', '.jpeg', '.png', '.pdf']
-            ext = os.path.splitext(document_file.name)[1].lower()
-            if ext not in valid_extensions:
+            if not document_file.name.lower().endswith(_DOC_EXTS):
                 raise forms.ValidationError('Unsupported file format. Please upload JPG, JPEG, PNG, or PDF files.')
         
         return document_file
@@ -90,7 +95,7 @@ class LoanWithdrawalForm(forms.ModelForm):
         max_length=15,
         widget=forms.TextInput(attrs={
             'placeholder': '2547XXXXXXXX',
-            'pattern': '2547\\d{8}',
+            'pattern': '^2547[0-9]{8}$',
             'title': 'Enter M-Pesa number in format 2547XXXXXXXX',
             'class': 'form-control'
         })
@@ -102,7 +107,7 @@ class LoanWithdrawalForm(forms.ModelForm):
     
     def clean_mpesa_number(self):
         mpesa_number = self.cleaned_data['mpesa_number']
-        if not mpesa_number.startswith('2547') or len(mpesa_number) != 12:
+        if not _MPESA_RE.fullmatch(mpesa_number):
             raise forms.ValidationError('Please enter a valid M-Pesa number starting with 2547 followed by 8 digits (e.g., 254712345678)')
         return mpesa_number
 
@@ -112,7 +117,7 @@ class LoanPaymentForm(forms.ModelForm):
         required=False,
         widget=forms.TextInput(attrs={
             'placeholder': '2547XXXXXXXX',
-            'pattern': '2547\\d{8}',
+            'pattern': '^2547[0-9]{8}$',
             'title': 'Enter M-Pesa number in format 2547XXXXXXXX',
             'class': 'form-control'
         })
@@ -131,10 +136,13 @@ class LoanPaymentForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         if self.loan_application:
-            # Set default amount to next due payment
-            next_payment = self.loan_application.payments.filter(
-                status__in=['pending', 'overdue']
-            ).order_by('due_date').first()
+            # Set default amount to next due payment, reusing the caller's prefetch if any
+            pending = getattr(self.loan_application, '_prefetched_payments', None)
+            if pending is None:
+                pending = list(self.loan_application.payments.filter(
+                    status__in=[LoanPayment.Status.PENDING, LoanPayment.Status.OVERDUE]
+                ).order_by('due_date')[:1])
+            next_payment = pending[0] if pending else None
             if next_payment:
                 self.fields['amount'].initial = next_payment.amount
             else:
@@ -148,7 +156,7 @@ class LoanPaymentForm(forms.ModelForm):
         if payment_method == 'mpesa' and not mpesa_number:
             raise forms.ValidationError('M-Pesa number is required for M-Pesa payments')
         
-        if mpesa_number and (not mpesa_number.startswith('2547') or len(mpesa_number) != 12):
+        if mpesa_number and not _MPESA_RE.fullmatch(mpesa_number):
             raise forms.ValidationError('Please enter a valid M-Pesa number starting with 2547 followed by 8 digits (e.g., 254712345678)')
         
         return mpesa_number
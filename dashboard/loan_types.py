@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from .models import LoanType
+
+# Cleared by dashboard.signals when a loan type changes; that only reaches
+# every worker because CACHES is a shared backend (see settings)
+ACTIVE_LOAN_TYPES_KEY = 'loan_types:active:v1'
+ACTIVE_LOAN_TYPES_TIMEOUT = 60 * 60
+
+
+def get_active_loan_types(category=None):
+    """Return the active loan types, optionally limited to one category
+
+    The full list is cached; a category is filtered from the cached list so
+    every category shares the one cache entry.
+    """
+    loan_types = cache.get_or_set(
+        ACTIVE_LOAN_TYPES_KEY, lambda: list(LoanType.objects.filter(is_active=True)), ACTIVE_LOAN_TYPES_TIMEOUT
+    )
+    if category:
+        loan_types = [loan_type for loan_type in loan_types if loan_type.category == category]
+    return loan_types
+
+
+def clear_active_loan_types():
+    cache.delete(ACTIVE_LOAN_TYPES_KEY)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from dashboard.models import LoanPayment
+
+
+class Command(BaseCommand):
+    help = 'Flag unpaid loan payments past their due date as overdue. Run daily (e.g. from cron).'
+
+    def handle(self, *args, **options):
+        updated = LoanPayment.objects.mark_overdue()
+        self.stdout.write(self.style.SUCCESS(f'{updated} payment(s) marked as overdue.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from dashboard.notifications import send_overdue_reminders
+
+
+class Command(BaseCommand):
+    help = 'Notify borrowers about overdue loan payments. Run daily (e.g. from cron).'
+
+    def handle(self, *args, **options):
+        created = send_overdue_reminders()
+        self.stdout.write(self.style.SUCCESS(f'{created} overdue reminder(s) sent.'))
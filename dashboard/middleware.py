@@ -0,0 +1,41 @@
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+# Upload limits per URL name, matching the clean_* checks in dashboard.forms
+UPLOAD_LIMITS = {
+    'profile': 2 * 1024 * 1024,
+    'profile_update': 2 * 1024 * 1024,
+    'loan_detail': 5 * 1024 * 1024,
+}
+DEFAULT_UPLOAD_LIMIT = 5 * 1024 * 1024
+# Allowance for the multipart envelope and the other form fields
+UPLOAD_OVERHEAD = 64 * 1024
+# Bodies up to this size are within every limit, so no URL lookup is needed
+ALWAYS_ALLOWED_SIZE = min(DEFAULT_UPLOAD_LIMIT, *UPLOAD_LIMITS.values()) + UPLOAD_OVERHEAD
+
+
+class MaxUploadSizeMiddleware:
+    """Reject oversized request bodies before Django reads them"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+
+        # Only resolve the URL when the body could exceed its limit
+        if content_length <= ALWAYS_ALLOWED_SIZE:
+            return self.get_response(request)
+        if content_length > self.get_limit(request) + UPLOAD_OVERHEAD:
+            return HttpResponse('Uploaded file is too large.', status=413)
+        return self.get_response(request)
+
+    def get_limit(self, request):
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return DEFAULT_UPLOAD_LIMIT
+        return UPLOAD_LIMITS.get(url_name, DEFAULT_UPLOAD_LIMIT)
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_borrowerprofile_profile_picture'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loanapplication',
+            index=models.Index(fields=['-application_date'], name='loanapp_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanapplication',
+            index=models.Index(fields=['status', 'application_date'], name='loanapp_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanapplication',
+            index=models.Index(fields=['applicant', '-application_date'], name='loanapp_applicant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanpayment',
+            index=models.Index(fields=['loan_application', 'due_date'], name='payment_loan_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanpayment',
+            index=models.Index(fields=['status', 'due_date'], name='payment_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:54
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_amount_paid(apps, schema_editor):
+    LoanApplication = apps.get_model('dashboard', 'LoanApplication')
+    LoanPayment = apps.get_model('dashboard', 'LoanPayment')
+    totals = (
+        LoanPayment.objects.filter(status='completed')
+        .values('loan_application')
+        .annotate(total=Sum('amount'))
+    )
+    for row in totals:
+        LoanApplication.objects.filter(pk=row['loan_application']).update(amount_paid=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_add_hot_column_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanapplication',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_amount_paid, migrations.RunPython.noop),
+    ]
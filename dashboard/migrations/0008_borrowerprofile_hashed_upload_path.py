@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:57
+
+import dashboard.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_loanapplication_amount_paid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrowerprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, default='profile_pictures/default.png', null=True, upload_to=dashboard.models.profile_picture_upload_to),
+        ),
+    ]
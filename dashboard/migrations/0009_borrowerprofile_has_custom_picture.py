@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-15 06:58
+
+from django.db import migrations, models
+
+
+def backfill_has_custom_picture(apps, schema_editor):
+    BorrowerProfile = apps.get_model('dashboard', 'BorrowerProfile')
+    BorrowerProfile.objects.exclude(profile_picture__isnull=True).exclude(
+        profile_picture__in=['', 'profile_pictures/default.png']
+    ).update(has_custom_picture=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_borrowerprofile_hashed_upload_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowerprofile',
+            name='has_custom_picture',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_has_custom_picture, migrations.RunPython.noop),
+    ]
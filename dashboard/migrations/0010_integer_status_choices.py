@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-15 07:00
+
+from django.db import migrations, models
+
+# Old string values for each integer choice, in choice order
+VALUE_MAPS = {
+    ('loanapplication', 'status'): ['pending', 'approved', 'rejected', 'under_review', 'more_info'],
+    ('loanpayment', 'status'): ['pending', 'processing', 'completed', 'failed', 'overdue'],
+    ('loanwithdrawal', 'status'): ['pending', 'processing', 'completed', 'failed'],
+    ('notification', 'notification_type'): ['application_update', 'payment_reminder', 'system', 'withdrawal', 'payment'],
+}
+
+
+def strings_to_numbers(apps, schema_editor):
+    """Rewrite the stored strings as digits so the column can be cast to an integer"""
+    for (model_name, field), values in VALUE_MAPS.items():
+        model = apps.get_model('dashboard', model_name)
+        for number, value in enumerate(values):
+            model.objects.filter(**{field: value}).update(**{field: str(number)})
+
+
+def numbers_to_strings(apps, schema_editor):
+    for (model_name, field), values in VALUE_MAPS.items():
+        model = apps.get_model('dashboard', model_name)
+        for number, value in enumerate(values):
+            model.objects.filter(**{field: str(number)}).update(**{field: value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_borrowerprofile_has_custom_picture'),
+    ]
+
+    operations = [
+        migrations.RunPython(strings_to_numbers, numbers_to_strings),
+        migrations.AlterField(
+            model_name='loanapplication',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending Review'), (1, 'Approved'), (2, 'Rejected'), (3, 'Under Review'), (4, 'More Information Needed')], default=0),
+        ),
+        migrations.AlterField(
+            model_name='loanpayment',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Processing'), (2, 'Completed'), (3, 'Failed'), (4, 'Overdue')], default=0),
+        ),
+        migrations.AlterField(
+            model_name='loanwithdrawal',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Processing'), (2, 'Completed'), (3, 'Failed')], default=0),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Application Update'), (1, 'Payment Reminder'), (2, 'System Notification'), (3, 'Withdrawal Update'), (4, 'Payment Update')]),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_integer_status_choices'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notif_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['title', 'created_at'], name='notif_title_created'),
+        ),
+    ]
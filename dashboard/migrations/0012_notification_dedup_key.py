@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-15 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_notification_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_title_created',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='dedup_key',
+            field=models.CharField(blank=True, editable=False, max_length=128, null=True, unique=True),
+        ),
+    ]
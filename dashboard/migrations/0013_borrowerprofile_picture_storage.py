@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-15 07:26
+
+import dashboard.models
+import dashboard.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_notification_dedup_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrowerprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, default='profile_pictures/default.png', null=True, storage=dashboard.storage.profile_picture_storage, upload_to=dashboard.models.profile_picture_upload_to),
+        ),
+    ]
@@ -1,10 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import timedelta
-from django.db.models import Sum
-import os  # Add this import
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import Exists, F, OuterRef, Q
+from .storage import profile_picture_storage
+
+CENTS = Decimal('0.01')
 
 class LoanType(models.Model):
     LOAN_CATEGORIES = [
@@ -12,6 +15,7 @@ class LoanType(models.Model):
         ('unsecured', 'Unsecured Loans'),
         ('mobile', 'Mobile Loans'),
     ]
+    _CATEGORY_DISPLAY = dict(LOAN_CATEGORIES)
     
     name = models.CharField(max_length=100)
     category = models.CharField(max_length=20, choices=LOAN_CATEGORIES)
@@ -25,14 +29,20 @@ class LoanType(models.Model):
     is_active = models.BooleanField(default=True)
     
     def __str__(self):
-        return f"{self.name} ({self.get_category_display()})"
+        return f"{self.name} ({self._CATEGORY_DISPLAY.get(self.category, self.category)})"
+
+def profile_picture_upload_to(instance, filename):
+    """Profile pictures are renamed to a hash of their content by their storage"""
+    return f'profile_pictures/{filename}'
+
 class BorrowerProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     id_number = models.CharField(max_length=20, unique=True)
     phone_number = models.CharField(max_length=15)
     date_of_birth = models.DateField()
     profile_picture = models.ImageField(
-        upload_to='profile_pictures/%Y/%m/%d/',
+        upload_to=profile_picture_upload_to,
+        storage=profile_picture_storage,
         null=True,
         blank=True,
         default='profile_pictures/default.png'
@@ -46,31 +56,52 @@ class BorrowerProfile(models.Model):
     monthly_income = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     employer_name = models.CharField(max_length=100, null=True, blank=True)
     credit_score = models.IntegerField(default=0)
+    has_custom_picture = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.id_number}"
     
+    def save(self, *args, **kwargs):
+        self.has_custom_picture = bool(self.profile_picture) and self.profile_picture.name != 'profile_pictures/default.png'
+        super().save(*args, **kwargs)
+    
     @property
     def has_profile_picture(self):
-        return bool(self.profile_picture) and self.profile_picture.name != 'profile_pictures/default.png'
+        return self.has_custom_picture
+    
+class LoanApplicationQuerySet(models.QuerySet):
+    def for_list(self):
+        """Applications with the relations shown on list pages"""
+        return self.select_related('applicant', 'loan_type')
+    
+    def for_detail(self):
+        """Applications with everything the detail page reads, including the withdrawal (if any)"""
+        return self.select_related(
+            'applicant', 'loan_type', 'approved_by', 'loanwithdrawal'
+        ).prefetch_related('payments', 'documents')
     
+    def with_withdrawal_flag(self):
+        """Annotate has_withdrawal without loading the withdrawal row"""
+        return self.annotate(
+            has_withdrawal=Exists(LoanWithdrawal.objects.filter(loan_application=OuterRef('pk')))
+        )
+
 class LoanApplication(models.Model):
-    APPLICATION_STATUS = [
-        ('pending', 'Pending Review'),
-        ('approved', 'Approved'),
-        ('rejected', 'Rejected'),
-        ('under_review', 'Under Review'),
-        ('more_info', 'More Information Needed'),
-    ]
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'Pending Review'
+        APPROVED = 1, 'Approved'
+        REJECTED = 2, 'Rejected'
+        UNDER_REVIEW = 3, 'Under Review'
+        MORE_INFO = 4, 'More Information Needed'
     
     applicant = models.ForeignKey(User, on_delete=models.CASCADE)
     loan_type = models.ForeignKey(LoanType, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(1000)])
     term_months = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(360)])
     purpose = models.TextField()
-    status = models.CharField(max_length=20, choices=APPLICATION_STATUS, default='pending')
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
     application_date = models.DateTimeField(auto_now_add=True)
     approved_date = models.DateTimeField(null=True, blank=True)
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_loans')
@@ -79,61 +110,95 @@ class LoanApplication(models.Model):
     # Calculated fields
     monthly_installment = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     total_repayment = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    objects = LoanApplicationQuerySet.as_manager()
     
     class Meta:
         ordering = ['-application_date']
+        indexes = [
+            models.Index(fields=['-application_date'], name='loanapp_date_idx'),
+            models.Index(fields=['status', 'application_date'], name='loanapp_status_date_idx'),
+            models.Index(fields=['applicant', '-application_date'], name='loanapp_applicant_date_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can detect approval
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
     
     def save(self, *args, **kwargs):
         # Calculate repayment amounts when loan is approved
-        if self.status == 'approved' and not self.monthly_installment:
+        if self.status == self.Status.APPROVED and not self.monthly_installment:
             self.calculate_repayment()
+        just_approved = (
+            self.status == self.Status.APPROVED
+            and getattr(self, '_loaded_status', None) != self.Status.APPROVED
+        )
         super().save(*args, **kwargs)
-        if self.status == 'approved':
-            self.create_payment_schedule()
+        self._loaded_status = self.status
+        if just_approved:
+            # Build the schedule once the approval is committed, not on every re-save
+            transaction.on_commit(self.create_payment_schedule)
     
     def calculate_repayment(self):
         """Calculate monthly installment and total repayment"""
         if self.loan_type and self.amount and self.term_months:
-            monthly_rate = float(self.loan_type.interest_rate) / 100 / 12
-            principal = float(self.amount)
+            monthly_rate = Decimal(self.loan_type.interest_rate) / 1200
+            principal = Decimal(self.amount)
             term = self.term_months
             
             # Monthly installment formula: P * r * (1+r)^n / ((1+r)^n - 1)
             if monthly_rate > 0:
-                monthly_installment = (principal * monthly_rate * (1 + monthly_rate) ** term) / ((1 + monthly_rate) ** term - 1)
+                factor = (1 + monthly_rate) ** term
+                monthly_installment = principal * monthly_rate * factor / (factor - 1)
             else:
                 monthly_installment = principal / term
                 
-            self.monthly_installment = round(monthly_installment, 2)
-            self.total_repayment = round(monthly_installment * term, 2)
+            self.monthly_installment = monthly_installment.quantize(CENTS, rounding=ROUND_HALF_UP)
+            self.total_repayment = self.monthly_installment * term
     
     def create_payment_schedule(self):
         """Create payment schedule when loan is approved"""
-        # Clear existing payments
-        self.payments.all().delete()
-        
-        # Create monthly payments
-        for i in range(self.term_months):
-            due_date = timezone.now().date() + timedelta(days=30 * (i + 1))
-            LoanPayment.objects.create(
+        today = timezone.now().date()
+        payments = [
+            LoanPayment(
                 loan_application=self,
                 amount=self.monthly_installment,
-                due_date=due_date,
+                due_date=today + timedelta(days=30 * (i + 1)),
                 installment_number=i + 1,
-                status='pending'
+                status=LoanPayment.Status.PENDING
             )
+            for i in range(self.term_months)
+        ]
+        
+        with transaction.atomic():
+            # The UPDATE row-locks the application, so concurrent approvals
+            # can't interleave their schedules
+            LoanApplication.objects.filter(pk=self.pk).update(amount_paid=0)
+            self.amount_paid = 0
+            
+            # Replace existing payments with the new schedule in one commit.
+            # amount_paid was reset above, so delete without the post_delete
+            # signal (which would subtract completed payments a second time)
+            self.payments.all()._raw_delete(LoanPayment.objects.db)
+            LoanPayment.objects.bulk_create(payments, batch_size=200)
+    
+    @property
+    def status_key(self):
+        """Lowercase status name, e.g. 'under_review', for CSS classes"""
+        return self.Status(self.status).name.lower()
     
     @property
     def total_paid(self):
-        """Calculate total amount paid so far"""
-        result = self.payments.filter(status='completed').aggregate(
-            total=Sum('amount')
-        )['total']
-        return result or 0
+        """Total amount paid so far, kept up to date by LoanPayment"""
+        return self.amount_paid
     
     @property
     def remaining_balance(self):
-        """Calculate remaining balance"""
+        """Remaining balance, read from the stored totals without touching payments"""
         if self.total_repayment:
             return float(self.total_repayment) - float(self.total_paid)
         return 0
@@ -141,14 +206,15 @@ class LoanApplication(models.Model):
     @property
     def next_payment_due(self):
         """Get next due payment"""
-        return self.payments.filter(status__in=['pending', 'overdue']).order_by('due_date').first()
+        return self.payments.filter(
+            status__in=[LoanPayment.Status.PENDING, LoanPayment.Status.OVERDUE]
+        ).order_by('due_date').first()
     
     def __str__(self):
         return f"{self.applicant.username} - {self.loan_type.name} - {self.amount}"
 
 class LoanDocument(models.Model):
-    loan_application = models.ForeignKey(LoanApplication, on_delete=models.CASCADE, related_name='documents')
-    document_type = models.CharField(max_length=50, choices=[
+    DOCUMENT_TYPES = [
         ('id_front', 'National ID Front'),
         ('id_back', 'National ID Back'),
         ('passport', 'Passport Photo'),
@@ -156,22 +222,40 @@ class LoanDocument(models.Model):
         ('bank_statement', 'Bank Statement'),
         ('business_registration', 'Business Registration'),
         ('other', 'Other'),
-    ])
+    ]
+    _DOCUMENT_TYPE_DISPLAY = dict(DOCUMENT_TYPES)
+    
+    loan_application = models.ForeignKey(LoanApplication, on_delete=models.CASCADE, related_name='documents')
+    document_type = models.CharField(max_length=50, choices=DOCUMENT_TYPES)
     document_file = models.FileField(upload_to='loan_documents/%Y/%m/%d/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     verified = models.BooleanField(default=False)
     
     def __str__(self):
-        return f"{self.loan_application} - {self.get_document_type_display()}"
+        return f"{self.loan_application} - {self._DOCUMENT_TYPE_DISPLAY.get(self.document_type, self.document_type)}"
+
+class LoanPaymentQuerySet(models.QuerySet):
+    def overdue(self):
+        """Payments past their due date that have not been paid"""
+        return self.filter(LoanPayment.overdue_q())
+    
+    def mark_overdue(self):
+        """Flag unpaid payments past their due date as overdue in one UPDATE"""
+        return self.filter(
+            due_date__lt=timezone.now().date(),
+            status__in=LoanPayment.UNPAID_STATUSES
+        ).update(status=LoanPayment.Status.OVERDUE)
 
 class LoanPayment(models.Model):
-    PAYMENT_STATUS = [
-        ('pending', 'Pending'),
-        ('processing', 'Processing'),
-        ('completed', 'Completed'),
-        ('failed', 'Failed'),
-        ('overdue', 'Overdue'),
-    ]
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'Pending'
+        PROCESSING = 1, 'Processing'
+        COMPLETED = 2, 'Completed'
+        FAILED = 3, 'Failed'
+        OVERDUE = 4, 'Overdue'
+    
+    # Statuses that count as overdue once the due date has passed
+    UNPAID_STATUSES = [Status.PENDING, Status.FAILED]
     
     PAYMENT_METHODS = [
         ('mpesa', 'M-Pesa'),
@@ -183,55 +267,118 @@ class LoanPayment(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     payment_date = models.DateTimeField(null=True, blank=True)
     due_date = models.DateField()
-    status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='pending')
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, blank=True)
     mpesa_number = models.CharField(max_length=15, blank=True)
     transaction_id = models.CharField(max_length=100, blank=True)
     is_installment = models.BooleanField(default=True)
     installment_number = models.PositiveIntegerField(default=1)
     
+    objects = LoanPaymentQuerySet.as_manager()
+    
     class Meta:
         ordering = ['due_date']
+        indexes = [
+            models.Index(fields=['loan_application', 'due_date'], name='payment_loan_due_idx'),
+            models.Index(fields=['status', 'due_date'], name='payment_status_due_idx'),
+        ]
     
     def __str__(self):
         return f"Payment - {self.loan_application} - KSh {self.amount}"
     
+    @classmethod
+    def overdue_q(cls):
+        """Condition matching payments past their due date that have not been paid"""
+        return (
+            Q(status=cls.Status.OVERDUE) |
+            Q(due_date__lt=timezone.now().date(), status__in=cls.UNPAID_STATUSES)
+        )
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the stored row adds to its loan's amount_paid
+        instance._loaded_paid = instance._paid_contribution()
+        return instance
+    
+    def _paid_contribution(self):
+        """(loan id, amount) this payment counts towards amount_paid, or None"""
+        if self.__dict__.get('status') != self.Status.COMPLETED:
+            return None
+        return (self.__dict__.get('loan_application_id'), self.__dict__.get('amount'))
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        
+        # Keep the parent's running total in sync with completed payments,
+        # including a completed payment whose amount or loan changed
+        paid = self._paid_contribution()
+        previous = getattr(self, '_loaded_paid', None)
+        if paid != previous:
+            if previous:
+                self._adjust_amount_paid(previous[0], -previous[1])
+            if paid:
+                self._adjust_amount_paid(*paid)
+        self._loaded_paid = paid
+    
+    def remove_from_amount_paid(self):
+        """Take a deleted payment back off its loan's total (see dashboard.signals)"""
+        previous = getattr(self, '_loaded_paid', None)
+        if previous:
+            self._adjust_amount_paid(previous[0], -previous[1])
+        self._loaded_paid = None
+    
+    def _adjust_amount_paid(self, loan_application_id, delta):
+        LoanApplication.objects.filter(pk=loan_application_id).update(
+            amount_paid=F('amount_paid') + delta
+        )
+        if LoanPayment.loan_application.is_cached(self) and self.loan_application.pk == loan_application_id:
+            self.loan_application.amount_paid += delta
+    
     @property
     def is_overdue(self):
-        return self.due_date < timezone.now().date() and self.status in ['pending', 'failed']
+        if self.status == self.Status.OVERDUE:
+            return True
+        return self.due_date < timezone.now().date() and self.status in self.UNPAID_STATUSES
 
 class Notification(models.Model):
+    class Type(models.IntegerChoices):
+        APPLICATION_UPDATE = 0, 'Application Update'
+        PAYMENT_REMINDER = 1, 'Payment Reminder'
+        SYSTEM = 2, 'System Notification'
+        WITHDRAWAL = 3, 'Withdrawal Update'
+        PAYMENT = 4, 'Payment Update'
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     message = models.TextField()
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    notification_type = models.CharField(max_length=20, choices=[
-        ('application_update', 'Application Update'),
-        ('payment_reminder', 'Payment Reminder'),
-        ('system', 'System Notification'),
-        ('withdrawal', 'Withdrawal Update'),
-        ('payment', 'Payment Update'),
-    ])
+    notification_type = models.PositiveSmallIntegerField(choices=Type.choices)
+    # Set for notifications that must only be sent once, e.g. 'approved:<loan id>'
+    dedup_key = models.CharField(max_length=128, null=True, blank=True, unique=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created'),
+            models.Index(fields=['user', '-created_at'], name='notif_user_created'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
 class LoanWithdrawal(models.Model):
-    WITHDRAWAL_STATUS = [
-        ('pending', 'Pending'),
-        ('processing', 'Processing'),
-        ('completed', 'Completed'),
-        ('failed', 'Failed'),
-    ]
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'Pending'
+        PROCESSING = 1, 'Processing'
+        COMPLETED = 2, 'Completed'
+        FAILED = 3, 'Failed'
     
     loan_application = models.OneToOneField(LoanApplication, on_delete=models.CASCADE)
     mpesa_number = models.CharField(max_length=15)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
-    status = models.CharField(max_length=20, choices=WITHDRAWAL_STATUS, default='pending')
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
     withdrawal_date = models.DateTimeField(auto_now_add=True)
     processed_date = models.DateTimeField(null=True, blank=True)
     transaction_id = models.CharField(max_length=100, blank=True)
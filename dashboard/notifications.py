@@ -0,0 +1,151 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from .models import LoanApplication, LoanPayment, Notification
+
+# Safety net: recount from the database at least this often
+UNREAD_COUNT_TIMEOUT = 60 * 60
+
+
+def create_notification(user, title, message, notification_type=Notification.Type.SYSTEM, dedup_key=None):
+    """Helper function to create notifications
+
+    The notification is written once the current transaction commits (right
+    away under autocommit), so a rolled-back change never notifies the user.
+    With a dedup_key, nothing is written if a notification with that key
+    already exists.
+    """
+    transaction.on_commit(
+        lambda: _create_notification(user, title, message, notification_type, dedup_key)
+    )
+
+
+def _create_notification(user, title, message, notification_type, dedup_key):
+    if dedup_key is None:
+        Notification.objects.create(
+            user=user,
+            title=title,
+            message=message,
+            notification_type=notification_type
+        )
+        return
+    Notification.objects.get_or_create(
+        dedup_key=dedup_key,
+        defaults={
+            'user': user,
+            'title': title,
+            'message': message,
+            'notification_type': notification_type,
+        }
+    )
+
+
+class NotificationBuffer:
+    """Collect several notifications for one user and insert them together
+
+        with NotificationBuffer(request.user) as notifications:
+            notifications.add(title, message, Notification.Type.PAYMENT)
+
+    On exit the buffered notifications are written with a single bulk_create
+    once the current transaction commits. Nothing is written if the block raises.
+    """
+    
+    def __init__(self, user):
+        self.user = user
+        self.notifications = []
+    
+    def add(self, title, message, notification_type=Notification.Type.SYSTEM):
+        self.notifications.append(Notification(
+            user=self.user,
+            title=title,
+            message=message,
+            notification_type=notification_type
+        ))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and self.notifications:
+            transaction.on_commit(lambda: _bulk_create_notifications(self.user.id, self.notifications))
+        return False
+
+
+def _bulk_create_notifications(user_id, notifications):
+    Notification.objects.bulk_create(notifications)
+    # bulk_create skips post_save, so count the new unread notifications here
+    incr_unread_count(user_id, len(notifications))
+
+
+def unread_count_key(user_id):
+    return f'notif:unread:{user_id}'
+
+
+def get_unread_count(user_id):
+    """Return the user's unread notification count, counting in the DB on a cache miss"""
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def get_request_unread_count(request):
+    """Unread count for the request's user, looked up at most once per request"""
+    if not request.user.is_authenticated:
+        return 0
+    if not hasattr(request, '_unread_notif_count'):
+        request._unread_notif_count = get_unread_count(request.user.id)
+    return request._unread_notif_count
+
+
+def incr_unread_count(user_id, delta=1):
+    """Adjust a cached count in place; if nothing is cached the next read recounts"""
+    try:
+        cache.incr(unread_count_key(user_id), delta)
+    except ValueError:
+        pass
+
+
+def reset_unread_count(user_id):
+    cache.delete(unread_count_key(user_id))
+
+
+def reset_unread_counts(user_ids):
+    cache.delete_many([unread_count_key(user_id) for user_id in user_ids])
+
+
+def send_overdue_reminders():
+    """Create one overdue reminder per approved loan with overdue payments
+
+    Each reminder carries a per-loan, per-day dedup_key, so running this more
+    than once a day is harmless. Returns the number of notifications created.
+    """
+    today = timezone.localdate().isoformat()
+    overdue_loans = (
+        LoanPayment.objects.overdue()
+        .filter(loan_application__status=LoanApplication.Status.APPROVED)
+        .values('loan_application_id', 'loan_application__applicant_id', 'loan_application__loan_type__name')
+        .annotate(overdue_count=Count('id'))
+    )
+    reminders = [
+        Notification(
+            user_id=row['loan_application__applicant_id'],
+            title='Payment Overdue',
+            message=f"You have {row['overdue_count']} overdue payment(s) for your {row['loan_application__loan_type__name']}. Please make payment to avoid penalties.",
+            notification_type=Notification.Type.PAYMENT_REMINDER,
+            dedup_key=f"overdue:{row['loan_application_id']}:{today}"
+        )
+        for row in overdue_loans
+    ]
+    already_sent = set(Notification.objects.filter(
+        dedup_key__in=[reminder.dedup_key for reminder in reminders]
+    ).values_list('dedup_key', flat=True))
+    reminders = [reminder for reminder in reminders if reminder.dedup_key not in already_sent]
+    
+    # ignore_conflicts covers a concurrent run inserting the same keys
+    Notification.objects.bulk_create(reminders, batch_size=1000, ignore_conflicts=True)
+    reset_unread_counts({reminder.user_id for reminder in reminders})
+    return len(reminders)
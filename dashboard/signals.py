@@ -0,0 +1,50 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import LoanApplication, LoanPayment, LoanType, Notification
+from .loan_types import clear_active_loan_types
+from .notifications import create_notification, incr_unread_count, reset_unread_count
+
+
+@receiver([post_save, post_delete], sender=LoanType)
+def clear_active_loan_types_on_change(sender, **kwargs):
+    """Drop the cached active loan types whenever a loan type changes"""
+    clear_active_loan_types()
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_save(sender, instance, created, **kwargs):
+    """Count new unread notifications; recount after any other change"""
+    if created:
+        if not instance.is_read:
+            incr_unread_count(instance.user_id)
+    else:
+        reset_unread_count(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    reset_unread_count(instance.user_id)
+
+
+@receiver(post_save, sender=LoanApplication)
+def notify_on_approval(sender, instance, **kwargs):
+    """Tell the applicant once, when their application becomes approved"""
+    # post_save runs before save() refreshes _loaded_status, so it still
+    # holds the status the row had before this save
+    if instance.status != LoanApplication.Status.APPROVED:
+        return
+    if getattr(instance, '_loaded_status', None) == LoanApplication.Status.APPROVED:
+        return
+    create_notification(
+        user=instance.applicant,
+        title='Application Approved! 🎉',
+        message=f'Great news! Your {instance.loan_type.name} application for KSh {instance.amount:,.2f} has been approved. You can now withdraw the funds.',
+        notification_type=Notification.Type.APPLICATION_UPDATE,
+        dedup_key=f'approved:{instance.pk}'
+    )
+
+
+@receiver(post_delete, sender=LoanPayment)
+def update_amount_paid_on_delete(sender, instance, **kwargs):
+    """Covers queryset and cascade deletes too, which skip Model.delete()"""
+    instance.remove_from_amount_paid()
@@ -0,0 +1,43 @@
+import hashlib
+import posixpath
+
+from django.core.files.storage import FileSystemStorage, storages
+
+try:
+    from storages.backends.s3boto3 import S3Boto3Storage
+except ImportError:  # django-storages is only needed when S3 is configured
+    S3Boto3Storage = None
+
+
+class ContentHashedNameMixin:
+    """Name each saved file after a hash of the content being stored
+
+    A file's name then changes whenever its content does, so the stored
+    objects never change and can be cached indefinitely.
+    """
+
+    def save(self, name, content, max_length=None):
+        hasher = hashlib.blake2b(digest_size=8)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        directory, filename = posixpath.split(name)
+        ext = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], f'{digest}{ext}')
+        # Identical content is already stored under this name
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+class HashedFileSystemStorage(ContentHashedNameMixin, FileSystemStorage):
+    pass
+
+
+if S3Boto3Storage is not None:
+    class HashedS3Boto3Storage(ContentHashedNameMixin, S3Boto3Storage):
+        pass
+
+
+def profile_picture_storage():
+    return storages['profile_pictures']
@@ -1,3 +1,192 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from PIL import Image
+
+from . import middleware, views
+from .forms import LoanWithdrawalForm
+from .models import BorrowerProfile, LoanApplication, LoanPayment, LoanType
+
+
+class ProfileUpdateTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = User.objects.create_user('borrower', password='pw')
+        self.client.login(username='borrower', password='pw')
+    
+    def test_url_resolves_to_files_aware_view(self):
+        self.assertIs(resolve('/profile/update/').func, views.profile_update)
+    
+    def test_uploaded_picture_is_saved(self):
+        image = BytesIO()
+        Image.new('RGB', (1, 1)).save(image, 'PNG')
+        picture = SimpleUploadedFile('me.png', image.getvalue(), content_type='image/png')
+        
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.post(reverse('profile_update'), {
+                'id_number': '12345678',
+                'phone_number': '254712345678',
+                'date_of_birth': '1990-01-01',
+                'employment_status': 'employed',
+                'profile_picture': picture,
+            })
+        
+        self.assertRedirects(response, reverse('dashboard'))
+        profile = BorrowerProfile.objects.get(user=self.user)
+        self.assertTrue(profile.has_custom_picture)
+
+
+
+def png_bytes(color):
+    image = BytesIO()
+    Image.new('RGB', (1, 1), color).save(image, 'PNG')
+    return image.getvalue()
+
+
+class ProfilePictureStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.profile = BorrowerProfile.objects.create(
+            user=User.objects.create_user('borrower', password='pw'),
+            id_number='12345678', phone_number='254712345678', date_of_birth='1990-01-01',
+            employment_status='employed'
+        )
+    
+    def test_programmatic_save_is_named_after_its_content(self):
+        self.profile.profile_picture.save('a.png', ContentFile(png_bytes('red')))
+        self.assertRegex(self.profile.profile_picture.name, r'^profile_pictures/[0-9a-f]{2}/[0-9a-f]{16}\.png$')
+        self.assertTrue(self.profile.has_custom_picture)
+    
+    def test_reupload_gets_a_new_name(self):
+        self.profile.profile_picture.save('a.png', ContentFile(png_bytes('red')))
+        first_name = self.profile.profile_picture.name
+        self.profile.profile_picture.save('a.png', ContentFile(png_bytes('blue')))
+        
+        self.assertNotEqual(self.profile.profile_picture.name, first_name)
+        self.assertEqual(self.profile.profile_picture.read(), png_bytes('blue'))
+    
+    def test_same_content_reuses_the_stored_file(self):
+        self.profile.profile_picture.save('a.png', ContentFile(png_bytes('red')))
+        first_name = self.profile.profile_picture.name
+        self.profile.profile_picture.save('b.PNG', ContentFile(png_bytes('red')))
+        self.assertEqual(self.profile.profile_picture.name, first_name)
+
+class AmountPaidTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        loan_type = LoanType.objects.create(
+            name='Personal', category='mobile', interest_rate=12, max_amount=100000, max_term=12,
+            description='d', requirements='r'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.loan = LoanApplication.objects.create(
+                applicant=self.user, loan_type=loan_type, amount=10000, term_months=6,
+                purpose='p', status=LoanApplication.Status.APPROVED
+            )
+        self.payment = self.loan.payments.order_by('due_date').first()
+        self.payment.status = LoanPayment.Status.COMPLETED
+        self.payment.save()
+    
+    def assertAmountPaid(self, expected):
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.amount_paid, expected)
+    
+    def test_completing_a_payment_adds_it(self):
+        self.assertAmountPaid(self.payment.amount)
+    
+    def test_editing_a_completed_amount_adjusts_total(self):
+        payment = LoanPayment.objects.get(pk=self.payment.pk)
+        payment.amount += 100
+        payment.save()
+        self.assertAmountPaid(payment.amount)
+    
+    def test_admin_bulk_delete_removes_completed_payments(self):
+        self.client.login(username='admin', password='pw')
+        completed = LoanPayment.objects.filter(status=LoanPayment.Status.COMPLETED)
+        response = self.client.post(reverse('admin:dashboard_loanpayment_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': list(completed.values_list('pk', flat=True)),
+            'post': 'yes',
+        })
+        
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(completed.exists())
+        self.assertAmountPaid(0)
+    
+    def test_rebuilding_the_schedule_resets_total(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.loan.create_payment_schedule()
+        self.assertAmountPaid(0)
+        self.assertEqual(self.loan.payments.count(), 6)
+
+
+class ActiveLoanTypesTests(TestCase):
+    def test_deactivated_type_leaves_cached_list(self):
+        User.objects.create_user('borrower', password='pw')
+        self.client.login(username='borrower', password='pw')
+        loan_type = LoanType.objects.create(
+            name='Seasonal Loan', category='mobile', interest_rate=12, max_amount=100000, max_term=12,
+            description='d', requirements='r'
+        )
+        self.assertContains(self.client.get(reverse('loan_list')), 'Seasonal Loan')
+        
+        loan_type.is_active = False
+        loan_type.save()
+        self.assertNotContains(self.client.get(reverse('loan_list')), 'Seasonal Loan')
+
+
+class MaxUploadSizeMiddlewareTests(TestCase):
+    def setUp(self):
+        self.middleware = middleware.MaxUploadSizeMiddleware(lambda request: HttpResponse())
+        self.factory = RequestFactory()
+    
+    def test_small_request_skips_url_resolution(self):
+        with mock.patch.object(middleware, 'resolve') as resolve_url:
+            response = self.middleware(self.factory.get('/profile/update/'))
+        self.assertEqual(response.status_code, 200)
+        resolve_url.assert_not_called()
+    
+    def test_oversized_profile_upload_is_rejected(self):
+        request = self.factory.post('/profile/update/', CONTENT_TYPE='multipart/form-data; boundary=x')
+        request.META['CONTENT_LENGTH'] = str(3 * 1024 * 1024)
+        self.assertEqual(self.middleware(request).status_code, 413)
+    
+    def test_document_upload_within_its_limit_is_allowed(self):
+        request = self.factory.post('/loans/1/', CONTENT_TYPE='multipart/form-data; boundary=x')
+        request.META['CONTENT_LENGTH'] = str(3 * 1024 * 1024)
+        self.assertEqual(self.middleware(request).status_code, 200)
+
+
+class AdminPaginationTests(TestCase):
+    def test_small_tables_show_their_real_count(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        LoanType.objects.create(
+            name='Personal', category='mobile', interest_rate=12, max_amount=100000, max_term=12,
+            description='d', requirements='r'
+        )
+        response = self.client.get(reverse('admin:dashboard_loantype_changelist'))
+        self.assertContains(response, '1 loan type')
+        self.assertNotContains(response, '9999999')
+
+
+class MpesaNumberTests(TestCase):
+    def test_accepts_ascii_digits(self):
+        self.assertTrue(LoanWithdrawalForm({'mpesa_number': '254712345678'}).is_valid())
+    
+    def test_rejects_non_ascii_digits(self):
+        form = LoanWithdrawalForm({'mpesa_number': '2547' + '\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668'})
+        self.assertFalse(form.is_valid())
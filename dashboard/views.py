@@ -1,25 +1,19 @@
+from decimal import Decimal
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Sum
+from django.db.models import Count, Q, Sum, Prefetch
 from django.core.paginator import Paginator
 from django.utils import timezone
 from .models import LoanApplication, LoanType, BorrowerProfile, Notification, LoanDocument, LoanWithdrawal, LoanPayment
+from .loan_types import get_active_loan_types
+from .notifications import NotificationBuffer, create_notification, reset_unread_count, reset_unread_counts
 from .forms import LoanApplicationForm, BorrowerProfileForm, UserUpdateForm, LoanDocumentForm, LoanWithdrawalForm, LoanPaymentForm
 
-def create_notification(user, title, message, notification_type='system'):
-    """Helper function to create notifications"""
-    return Notification.objects.create(
-        user=user,
-        title=title,
-        message=message,
-        notification_type=notification_type
-    )
-
 def home(request):
     """Public home page"""
     # Get active loan types from database
-    loan_types = LoanType.objects.filter(is_active=True)
+    loan_types = get_active_loan_types()
     
     context = {
         'loan_types': loan_types,
@@ -31,43 +25,42 @@ def dashboard(request):
     """User dashboard"""
     # Get user's loan applications
     user_loans = LoanApplication.objects.filter(applicant=request.user)
-    recent_loans = user_loans.order_by('-application_date')[:5]
+    recent_loans = user_loans.for_list().order_by('-application_date')[:5]
     
     # Get unread notifications
     unread_notifications = Notification.objects.filter(user=request.user, is_read=False)[:5]
     
-    # Calculate stats
-    total_applications = user_loans.count()
-    approved_loans = user_loans.filter(status='approved').count()
-    pending_applications = user_loans.filter(status__in=['pending', 'under_review', 'more_info']).count()
+    # Calculate stats in a single query
+    loan_stats = user_loans.aggregate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(status=LoanApplication.Status.APPROVED)),
+        pending=Count('id', filter=Q(status__in=[
+            LoanApplication.Status.PENDING, LoanApplication.Status.UNDER_REVIEW, LoanApplication.Status.MORE_INFO
+        ])),
+    )
     
-    # Calculate payment stats
+    # Calculate payment stats in a single query
     user_payments = LoanPayment.objects.filter(loan_application__applicant=request.user)
-    total_paid = user_payments.filter(status='completed').aggregate(Sum('amount'))['amount__sum'] or 0
-    overdue_payments = user_payments.filter(
-        due_date__lt=timezone.now().date(),
-        status__in=['pending', 'failed']
-    ).count()
+    payment_stats = user_payments.aggregate(
+        paid=Sum('amount', filter=Q(status=LoanPayment.Status.COMPLETED)),
+        overdue=Count('id', filter=LoanPayment.overdue_q()),
+    )
     
     context = {
         'recent_loans': recent_loans,
         'unread_notifications': unread_notifications,
-        'total_applications': total_applications,
-        'approved_loans': approved_loans,
-        'pending_applications': pending_applications,
-        'total_paid': total_paid,
-        'overdue_payments': overdue_payments,
+        'total_applications': loan_stats['total'],
+        'approved_loans': loan_stats['approved'],
+        'pending_applications': loan_stats['pending'],
+        'total_paid': payment_stats['paid'] or 0,
+        'overdue_payments': payment_stats['overdue'],
     }
     return render(request, 'dashboard/dashboard.html', context)
 
 @login_required
 def loan_list(request):
-    loan_types = LoanType.objects.filter(is_active=True)
-    
     # Filter by category if provided
-    category = request.GET.get('category')
-    if category:
-        loan_types = loan_types.filter(category=category)
+    loan_types = get_active_loan_types(request.GET.get('category'))
     
     context = {
         'loan_types': loan_types,
@@ -94,23 +87,22 @@ def loan_apply(request, loan_type_id):
             loan_application.loan_type = loan_type
             loan_application.save()
             
-            # Create notification for application submission
-            create_notification(
-                user=request.user,
-                title='Loan Application Submitted',
-                message=f'Your {loan_type.name} application for KSh {loan_application.amount:,.2f} has been submitted successfully and is under review.',
-                notification_type='application_update'
-            )
-            
-            # Create welcome notification for first-time applicants
-            user_loan_count = LoanApplication.objects.filter(applicant=request.user).count()
-            if user_loan_count == 1:
-                create_notification(
-                    user=request.user,
-                    title='Welcome to QuickLoan!',
-                    message='Thank you for your first loan application with us. We will review your application and get back to you soon.',
-                    notification_type='system'
+            with NotificationBuffer(request.user) as notifications:
+                # Create notification for application submission
+                notifications.add(
+                    title='Loan Application Submitted',
+                    message=f'Your {loan_type.name} application for KSh {loan_application.amount:,.2f} has been submitted successfully and is under review.',
+                    notification_type=Notification.Type.APPLICATION_UPDATE
                 )
+                
+                # Create welcome notification for first-time applicants
+                user_loan_count = LoanApplication.objects.filter(applicant=request.user).count()
+                if user_loan_count == 1:
+                    notifications.add(
+                        title='Welcome to QuickLoan!',
+                        message='Thank you for your first loan application with us. We will review your application and get back to you soon.',
+                        notification_type=Notification.Type.SYSTEM
+                    )
             
             messages.success(request, 'Loan application submitted successfully!')
             return redirect('loan_detail', application_id=loan_application.id)
@@ -127,10 +119,10 @@ def loan_apply(request, loan_type_id):
 def loan_detail(request, application_id):
     try:
         # First, check if the loan application exists at all
-        loan_application = LoanApplication.objects.get(id=application_id)
+        loan_application = LoanApplication.objects.for_detail().get(id=application_id)
         
         # Then check if the current user is the applicant
-        if loan_application.applicant != request.user:
+        if loan_application.applicant_id != request.user.id:
             messages.error(request, 'You do not have permission to view this loan application.')
             return redirect('application_history')
             
@@ -151,7 +143,7 @@ def loan_detail(request, application_id):
                 user=request.user,
                 title='Document Uploaded',
                 message=f'Your {document.get_document_type_display()} has been uploaded successfully for your {loan_application.loan_type.name} application.',
-                notification_type='application_update'
+                notification_type=Notification.Type.APPLICATION_UPDATE
             )
             
             messages.success(request, 'Document uploaded successfully!')
@@ -172,35 +164,19 @@ def loan_detail(request, application_id):
         ('passport', 'Passport Photo'),
     ]
     
-    # Get uploaded document types
-    uploaded_doc_types = [doc.document_type for doc in loan_application.documents.all()]
+    # Get uploaded document types (documents and payments come from the prefetch)
+    uploaded_doc_types = {doc.document_type for doc in loan_application.documents.all()}
+    payments = loan_application.payments.all()
     
     # Count completed payments for the template
-    completed_payments_count = loan_application.payments.filter(status='completed').count()
+    completed_payments_count = sum(1 for p in payments if p.status == LoanPayment.Status.COMPLETED)
     
-    # Check for overdue payments and create notifications
-    overdue_payments = loan_application.payments.filter(
-        due_date__lt=timezone.now().date(),
-        status__in=['pending', 'failed']
+    # Payments are ordered by due date, so the first open one is next
+    next_payment = next(
+        (p for p in payments if p.status in (LoanPayment.Status.PENDING, LoanPayment.Status.OVERDUE)),
+        None
     )
     
-    if overdue_payments.exists() and loan_application.status == 'approved':
-        # Create overdue payment notification (only once per day)
-        today = timezone.now().date()
-        recent_overdue_notification = Notification.objects.filter(
-            user=request.user,
-            title__contains='Payment Overdue',
-            created_at__date=today
-        ).exists()
-        
-        if not recent_overdue_notification:
-            create_notification(
-                user=request.user,
-                title='Payment Overdue',
-                message=f'You have {overdue_payments.count()} overdue payment(s) for your {loan_application.loan_type.name}. Please make payment to avoid penalties.',
-                notification_type='payment_reminder'
-            )
-    
     context = {
         'loan_application': loan_application,
         'document_form': document_form,
@@ -208,7 +184,7 @@ def loan_detail(request, application_id):
         'withdrawal': withdrawal,
         'total_paid': loan_application.total_paid,
         'remaining_balance': loan_application.remaining_balance,
-        'next_payment': loan_application.next_payment_due,
+        'next_payment': next_payment,
         'document_types': document_types,
         'uploaded_doc_types': uploaded_doc_types,
         'completed_payments_count': completed_payments_count,  # Added for template
@@ -218,14 +194,14 @@ def loan_detail(request, application_id):
 @login_required
 def loan_withdraw(request, application_id):
     loan_application = get_object_or_404(
-        LoanApplication, 
+        LoanApplication.objects.for_list().with_withdrawal_flag(), 
         id=application_id, 
         applicant=request.user,
-        status='approved'
+        status=LoanApplication.Status.APPROVED
     )
     
     # Check if already withdrawn
-    if hasattr(loan_application, 'loanwithdrawal'):
+    if loan_application.has_withdrawal:
         messages.info(request, 'Funds have already been withdrawn for this loan.')
         return redirect('loan_detail', application_id=application_id)
     
@@ -235,32 +211,29 @@ def loan_withdraw(request, application_id):
             withdrawal = form.save(commit=False)
             withdrawal.loan_application = loan_application
             withdrawal.amount = loan_application.amount
-            withdrawal.status = 'processing'
-            withdrawal.save()
             
-            # Simulate M-Pesa processing
-            withdrawal.status = 'completed'
+            # Simulate M-Pesa processing; the result is known up front, so insert it once
+            withdrawal.status = LoanWithdrawal.Status.COMPLETED
             withdrawal.transaction_id = f"MP{timezone.now().strftime('%Y%m%d%H%M%S')}"
             withdrawal.processed_date = timezone.now()
             withdrawal.save()
             
-            # Create withdrawal notification
-            create_notification(
-                user=request.user,
-                title='Loan Disbursement Successful! 🎉',
-                message=f'KSh {withdrawal.amount:,.2f} has been sent to your M-Pesa number {withdrawal.mpesa_number}. Transaction ID: {withdrawal.transaction_id}. Funds should arrive within 5 minutes.',
-                notification_type='withdrawal'
-            )
-            
-            # Create payment reminder notification
-            next_payment = loan_application.payments.first()
-            if next_payment:
-                create_notification(
-                    user=request.user,
-                    title='Payment Schedule Created',
-                    message=f'Your payment schedule has been created. First payment of KSh {loan_application.monthly_installment:,.2f} is due on {next_payment.due_date.strftime("%B %d, %Y")}.',
-                    notification_type='payment_reminder'
+            with NotificationBuffer(request.user) as notifications:
+                # Create withdrawal notification
+                notifications.add(
+                    title='Loan Disbursement Successful! 🎉',
+                    message=f'KSh {withdrawal.amount:,.2f} has been sent to your M-Pesa number {withdrawal.mpesa_number}. Transaction ID: {withdrawal.transaction_id}. Funds should arrive within 5 minutes.',
+                    notification_type=Notification.Type.WITHDRAWAL
                 )
+                
+                # Create payment reminder notification
+                next_payment = loan_application.payments.first()
+                if next_payment:
+                    notifications.add(
+                        title='Payment Schedule Created',
+                        message=f'Your payment schedule has been created. First payment of KSh {loan_application.monthly_installment:,.2f} is due on {next_payment.due_date.strftime("%B %d, %Y")}.',
+                        notification_type=Notification.Type.PAYMENT_REMINDER
+                    )
             
             messages.success(request, f'KSh {withdrawal.amount:,.2f} has been successfully sent to your M-Pesa account!')
             return redirect('loan_detail', application_id=application_id)
@@ -275,27 +248,29 @@ def loan_withdraw(request, application_id):
 
 @login_required
 def make_payment(request, application_id):
+    # Prefetch pending payments once; LoanPaymentForm reuses them as well
     loan_application = get_object_or_404(
-        LoanApplication, 
+        LoanApplication.objects.for_list().prefetch_related(Prefetch(
+            'payments',
+            queryset=LoanPayment.objects.filter(status__in=[LoanPayment.Status.PENDING, LoanPayment.Status.OVERDUE]).order_by('due_date'),
+            to_attr='_prefetched_payments'
+        )),
         id=application_id, 
         applicant=request.user
     )
     
     # Get pending payments
-    pending_payments = loan_application.payments.filter(
-        status__in=['pending', 'overdue']
-    ).order_by('due_date')
+    pending_payments = loan_application._prefetched_payments
     
     if request.method == 'POST':
         form = LoanPaymentForm(request.POST, loan_application=loan_application)
         if form.is_valid():
             payment = form.save(commit=False)
             payment.loan_application = loan_application
-            payment.status = 'processing'
             payment.payment_date = timezone.now()
             
             # Find which installment this payment is for and set due_date
-            next_payment = pending_payments.first()
+            next_payment = pending_payments[0] if pending_payments else None
             if next_payment:
                 payment.installment_number = next_payment.installment_number
                 payment.due_date = next_payment.due_date
@@ -303,46 +278,41 @@ def make_payment(request, application_id):
                 payment.due_date = timezone.now().date()
                 payment.installment_number = 1
             
-            payment.save()
-            
-            # Simulate payment processing
-            payment.status = 'completed'
+            # Simulate payment processing; the result is known up front, so insert it once
+            payment.status = LoanPayment.Status.COMPLETED
             payment.transaction_id = f"PY{timezone.now().strftime('%Y%m%d%H%M%S')}"
             payment.save()
             
             # Update the original payment record if it exists
             if next_payment:
-                next_payment.status = 'completed'
+                next_payment.status = LoanPayment.Status.COMPLETED
                 next_payment.transaction_id = payment.transaction_id
                 next_payment.payment_date = timezone.now()
-                next_payment.save()
+                next_payment.save(update_fields=['status', 'transaction_id', 'payment_date'])
             
-            # Create payment notification
-            create_notification(
-                user=request.user,
-                title='Payment Successful! ✅',
-                message=f'Payment of KSh {payment.amount:,.2f} for your {loan_application.loan_type.name} has been processed successfully. Transaction ID: {payment.transaction_id}.',
-                notification_type='payment'
-            )
-            
-            # Check if loan is fully paid
-            if loan_application.remaining_balance <= 0:
-                create_notification(
-                    user=request.user,
-                    title='Loan Fully Paid! 🎊',
-                    message=f'Congratulations! You have successfully completed all payments for your {loan_application.loan_type.name}. Thank you for being a valued customer.',
-                    notification_type='system'
+            with NotificationBuffer(request.user) as notifications:
+                # Create payment notification
+                notifications.add(
+                    title='Payment Successful! ✅',
+                    message=f'Payment of KSh {payment.amount:,.2f} for your {loan_application.loan_type.name} has been processed successfully. Transaction ID: {payment.transaction_id}.',
+                    notification_type=Notification.Type.PAYMENT
                 )
+                
+                # Check if loan is fully paid
+                if loan_application.remaining_balance <= 0:
+                    notifications.add(
+                        title='Loan Fully Paid! 🎊',
+                        message=f'Congratulations! You have successfully completed all payments for your {loan_application.loan_type.name}. Thank you for being a valued customer.',
+                        notification_type=Notification.Type.SYSTEM
+                    )
             
             messages.success(request, f'Payment of KSh {payment.amount:,.2f} processed successfully!')
             return redirect('loan_detail', application_id=application_id)
     else:
         form = LoanPaymentForm(loan_application=loan_application)
     
-    # Calculate total due amount safely
-    total_due = 0
-    for payment in pending_payments:
-        total_due += float(payment.amount)
+    # Total due over the already-loaded pending payments, no extra query needed
+    total_due = sum((payment.amount for payment in pending_payments), Decimal(0))
     
     context = {
         'form': form,
@@ -355,12 +325,13 @@ def make_payment(request, application_id):
 @login_required
 def payment_history(request, application_id):
     loan_application = get_object_or_404(
-        LoanApplication, 
+        LoanApplication.objects.for_list(), 
         id=application_id, 
         applicant=request.user
     )
     
-    payments = loan_application.payments.all().order_by('-due_date')
+    # The template iterates the payments anyway, so count them with len() there
+    payments = list(loan_application.payments.order_by('-due_date'))
     total_paid = loan_application.total_paid
     remaining_balance = loan_application.remaining_balance
     
@@ -398,7 +369,7 @@ def profile(request):
                 user=request.user,
                 title='Profile Updated',
                 message='Your profile information has been updated successfully.',
-                notification_type='system'
+                notification_type=Notification.Type.SYSTEM
             )
             
             messages.success(request, 'Profile updated successfully!')
@@ -439,61 +410,14 @@ def profile_update(request):
                     user=request.user,
                     title='Profile Completed!',
                     message='Your borrower profile has been completed successfully. You can now apply for loans.',
-                    notification_type='system'
-                )
-            else:
-                create_notification(
-                    user=request.user,
-                    title='Profile Updated',
-                    message='Your profile information has been updated successfully.',
-                    notification_type='system'
-                )
-            
-            messages.success(request, 'Profile completed successfully!')
-            return redirect('dashboard')
-    else:
-        form = BorrowerProfileForm(instance=profile)
-    
-    context = {
-        'form': form,
-        'is_update': is_update,
-    }
-    return render(request, 'dashboard/profile_update.html', context)
-
-@login_required
-def profile_update(request):
-    try:
-        profile = request.user.borrowerprofile
-        is_update = True
-    except BorrowerProfile.DoesNotExist:
-        profile = None
-        is_update = False
-    
-    if request.method == 'POST':
-        if is_update:
-            form = BorrowerProfileForm(request.POST, instance=profile)
-        else:
-            form = BorrowerProfileForm(request.POST)
-        
-        if form.is_valid():
-            profile = form.save(commit=False)
-            profile.user = request.user
-            profile.save()
-            
-            # Create profile completion notification
-            if not is_update:
-                create_notification(
-                    user=request.user,
-                    title='Profile Completed!',
-                    message='Your borrower profile has been completed successfully. You can now apply for loans.',
-                    notification_type='system'
+                    notification_type=Notification.Type.SYSTEM
                 )
             else:
                 create_notification(
                     user=request.user,
                     title='Profile Updated',
                     message='Your profile information has been updated successfully.',
-                    notification_type='system'
+                    notification_type=Notification.Type.SYSTEM
                 )
             
             messages.success(request, 'Profile completed successfully!')
@@ -509,25 +433,11 @@ def profile_update(request):
 
 @login_required
 def application_history(request):
-    applications = LoanApplication.objects.filter(applicant=request.user).order_by('-application_date')
-    
-    # Check for application status updates and create notifications
-    for application in applications:
-        if application.status == 'approved':
-            # Check if we haven't notified about this approval yet
-            recent_approval_notification = Notification.objects.filter(
-                user=request.user,
-                title__contains='Application Approved',
-                message__contains=f'{application.loan_type.name}'
-            ).exists()
-            
-            if not recent_approval_notification:
-                create_notification(
-                    user=request.user,
-                    title='Application Approved! 🎉',
-                    message=f'Great news! Your {application.loan_type.name} application for KSh {application.amount:,.2f} has been approved. You can now withdraw the funds.',
-                    notification_type='application_update'
-                )
+    # Only load the columns the history table shows (skips the purpose text)
+    applications = LoanApplication.objects.filter(applicant=request.user).select_related('loan_type').only(
+        'id', 'status', 'amount', 'term_months', 'application_date', 'rejection_reason',
+        'loan_type__name', 'loan_type__category'
+    ).order_by('-application_date')
     
     # Pagination
     paginator = Paginator(applications, 10)
@@ -541,8 +451,6 @@ def application_history(request):
 
 @login_required
 def notifications(request):
-    notifications_list = Notification.objects.filter(user=request.user).order_by('-created_at')
-    
     # Handle mark as read action
     if request.method == 'POST':
         if 'mark_read' in request.POST:
@@ -550,16 +458,18 @@ def notifications(request):
             if notification_id:
                 notification = get_object_or_404(Notification, id=notification_id, user=request.user)
                 notification.is_read = True
-                notification.save()
+                notification.save(update_fields=['is_read'])
                 messages.success(request, 'Notification marked as read.')
         
         elif 'mark_all_read' in request.POST:
-            updated_count = notifications_list.filter(is_read=False).update(is_read=True)
+            updated_count = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+            reset_unread_count(request.user.id)
             messages.success(request, f'{updated_count} notifications marked as read.')
         
         return redirect('notifications')
     
     # Pagination
+    notifications_list = Notification.objects.filter(user=request.user).order_by('-created_at')
     paginator = Paginator(notifications_list, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
@@ -584,16 +494,20 @@ def create_system_notification(request):
         message = request.POST.get('message')
         
         if title and message:
-            users = User.objects.filter(is_active=True)
-            for user in users:
-                create_notification(
-                    user=user,
+            user_ids = list(User.objects.filter(is_active=True).values_list('id', flat=True))
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id,
                     title=title,
                     message=message,
-                    notification_type='system'
+                    notification_type=Notification.Type.SYSTEM
                 )
+                for user_id in user_ids
+            ], batch_size=1000)
+            # bulk_create skips post_save, so drop the cached unread counts here
+            reset_unread_counts(user_ids)
             
-            messages.success(request, f'System notification sent to {users.count()} users.')
+            messages.success(request, f'System notification sent to {len(user_ids)} users.')
             return redirect('dashboard')
         else:
             messages.error(request, 'Title and message are required.')
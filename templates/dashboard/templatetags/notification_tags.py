@@ -1,10 +1,8 @@
 from django import template
-from ..models import Notification
+from dashboard.notifications import get_request_unread_count
 
 register = template.Library()
 
-@register.simple_tag
-def get_unread_notification_count(user):
-    if user.is_authenticated:
-        return Notification.objects.filter(user=user, is_read=False).count()
-    return 0
\ No newline at end of file
+@register.simple_tag(takes_context=True)
+def get_unread_notification_count(context):
+    return get_request_unread_count(context['request'])
\ No newline at end of file
@@ -60,6 +60,7 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'dashboard.middleware.MaxUploadSizeMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,6 +83,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'dashboard.context_processors.notifications',
             ],
         },
     },
@@ -141,6 +143,60 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Names files after a hash of their content (see dashboard.storage)
+    'profile_pictures': {'BACKEND': 'dashboard.storage.HashedFileSystemStorage'},
+}
+
+# Serve uploaded media from S3 when a bucket is configured, so files are
+# fetched from the bucket instead of this app. Loan documents hold ID scans
+# and bank statements, so URLs stay signed (no custom domain) and uploads
+# never overwrite an existing object with the same name
+AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
+if AWS_STORAGE_BUCKET_NAME:
+    STORAGES['default'] = {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'}
+    STORAGES['profile_pictures'] = {
+        'BACKEND': 'dashboard.storage.HashedS3Boto3Storage',
+        # Content-hashed names never change, so browsers may keep them for a year
+        'OPTIONS': {'object_parameters': {'CacheControl': 'max-age=31536000, immutable'}},
+    }
+    AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME')
+    AWS_S3_FILE_OVERWRITE = False
+    AWS_QUERYSTRING_AUTH = True
+
+# Cached values (unread notification counts, active loan types) are
+# invalidated on write, so every gunicorn worker has to share one cache.
+# Multi-worker deployments should set REDIS_URL.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    # Correctness fallback only, not a speedup: workers still share the
+    # values, but every write also counts the table and incr() is not
+    # atomic. Create the table on deploy with `python manage.py createcachetable`
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {
+                # One unread-count key per user, so allow far more than the default 300
+                'MAX_ENTRIES': 50000,
+                'CULL_FREQUENCY': 4,
+            },
+        }
+    }
+
+# Keep uploads up to 5MB in memory instead of spooling them to a temp file;
+# larger bodies are rejected by dashboard.middleware.MaxUploadSizeMiddleware
+FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
+
 # Authentication settings
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',